@@ -0,0 +1,55 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+class CompletionQueue:
+    """Collects finished LLM results and hands them to `flush` in batches.
+
+    `flush` receives a list of ``{"tid": task_id, "rs": result}`` parameter sets,
+    ready to be executed against ``COMPLETE_TASK`` as a single executemany.
+    """
+
+    def __init__(self, flush: Callable[[List[Dict]], Awaitable[None]], batch_size: int = 32, max_wait: float = 0.1):
+        self._flush = flush
+        self._batch_size = batch_size
+        self._max_wait = max_wait
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def put(self, task_id: int, result: str):
+        await self._queue.put((task_id, result))
+
+    def start(self):
+        self._worker = asyncio.create_task(self._drain())
+
+    async def stop(self):
+        """Wait for queued completions to be written, then stop the worker."""
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush([{"tid": task_id, "rs": result} for task_id, result in batch])
+            except Exception as e:
+                print(f"Writing task completions failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -1,12 +1,41 @@
-from sqlalchemy import Column, Integer, String, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, bindparam, create_engine, event, func, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from asyncio import current_task
 import datetime
 
 DATABASE_URL = "sqlite:///./mcpagent.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./mcpagent.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# A small persistent pool: under WAL a handful of readers can run alongside the single
+# writer SQLite allows. No overflow, so connections (and their pragmas) are never churned.
+POOL_OPTIONS = dict(pool_size=5, max_overflow=0, pool_recycle=3600, pool_pre_ping=True)
+
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Thread-local session registry; call ScopedSession.remove() once a unit of work is done.
+ScopedSession = scoped_session(SessionLocal)
+
+# Async engine used by the FastAPI app so DB work doesn't block the event loop.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+# One AsyncSession per asyncio task; call `await AsyncScopedSession.remove()` when the task is done.
+AsyncScopedSession = async_scoped_session(AsyncSessionLocal, scopefunc=current_task)
+
+def _set_sqlite_pragmas(dbapi_conn, _):
+    # WAL lets readers proceed while a long result is being committed.
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+event.listen(engine, "connect", _set_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 Base = declarative_base()
 
 class ResearchTaskORM(Base):
@@ -17,5 +46,56 @@ class ResearchTaskORM(Base):
     result = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
+_tasks = ResearchTaskORM.__table__
+
+# Hot write statements are built once at import so handlers only bind parameters;
+# the engine's compiled cache then reuses their compiled form on every call.
+
+# Core (not ORM) UPDATE so a list of parameter sets runs as one executemany.
+COMPLETE_TASK = (
+    update(_tasks)
+    .where(_tasks.c.id == bindparam("tid"))
+    .values(result=bindparam("rs"), status="completed")
+)
+
+# Passing None for `st` or `rs` keeps the stored value.
+_update_task = (
+    update(_tasks)
+    .where(_tasks.c.id == bindparam("tid"))
+    .values(
+        status=func.coalesce(bindparam("st", type_=String), _tasks.c.status),
+        result=func.coalesce(bindparam("rs", type_=String), _tasks.c.result),
+    )
+)
+UPDATE_TASK = _update_task.returning(*_tasks.c)
+UPDATE_TASK_STATUS = _update_task.returning(_tasks.c.status)
+
+# Task ownership by status: the API inserts its tasks as "queued" (held by a worker's
+# in-memory queue); the MCP server's tasks are "pending" and are never touched here.
+# At launch, before any worker runs, leftover "queued" rows can only be orphans of a
+# previous run, so they are marked "recovering"; each worker then claims recovering rows
+# back to "queued" in one statement, so every orphan is claimed by exactly one worker.
+MARK_ORPHANED_TASKS = update(_tasks).where(_tasks.c.status == "queued").values(status="recovering")
+CLAIM_RECOVERING_TASKS = (
+    update(_tasks)
+    .where(_tasks.c.status == "recovering")
+    .values(status="queued")
+    .returning(_tasks.c.id, _tasks.c.query)
+)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    try:
+        Base.metadata.create_all(bind=engine)
+    except OperationalError as e:
+        # Another process created the table between create_all's existence check and its DDL.
+        if "already exists" not in str(e):
+            raise
+
+def mark_orphaned_tasks():
+    """Mark API tasks left queued by a previous run for recovery.
+
+    Only call this before any API worker has started, or live tasks would be re-run.
+    """
+    with SessionLocal() as db:
+        db.execute(MARK_ORPHANED_TASKS)
+        db.commit()
@@ -0,0 +1,59 @@
+import asyncio
+from typing import List, Optional
+
+from app.llm.ollama_client import OllamaClient
+from app.llm.prompts import ANALYZE_MODEL, ANALYZE_PROMPT, MERGE_PROMPT
+
+# Roughly 2k tokens of English prose per section.
+SECTION_WORDS = 1500
+# Upper bound on section analyses and merges in flight against Ollama, shared by all requests.
+MAX_PARALLEL_SECTIONS = 4
+
+# Summaries combined per merge prompt. Each is up to the client's 512-token output, so a
+# group stays well inside Ollama's context window with the merge instruction intact.
+MERGE_GROUP_SIZE = 4
+
+_section_slots = asyncio.Semaphore(MAX_PARALLEL_SECTIONS)
+
+def split_content(content: str, section_words: int = SECTION_WORDS) -> List[str]:
+    """Split content into whitespace-delimited sections of at most `section_words` words."""
+    words = content.split()
+    if len(words) <= section_words:
+        return [content]
+    return [" ".join(words[i:i + section_words]) for i in range(0, len(words), section_words)]
+
+def _merge_prompt(summaries: List[str]) -> str:
+    parts = [f"Section {i}:\n{summary}" for i, summary in enumerate(summaries, 1)]
+    return MERGE_PROMPT.format(summaries="\n\n".join(parts))
+
+async def _generate(client: OllamaClient, prompt: str, model: str) -> Optional[str]:
+    async with _section_slots:
+        return await client.generate(prompt, model=model)
+
+async def prepare_prompt(client: OllamaClient, content: str, model: str = ANALYZE_MODEL) -> Optional[str]:
+    """Return the prompt whose completion is the final analysis of `content`.
+
+    Short content is analyzed directly. Long content is split into sections that
+    are analyzed concurrently; their summaries are merged in groups of
+    MERGE_GROUP_SIZE until one group is left, and the returned prompt merges it.
+    Returns None if any section analysis or intermediate merge failed, so a
+    partial analysis is never merged (or cached under the full content's key).
+    """
+    sections = split_content(content)
+    if len(sections) == 1:
+        return ANALYZE_PROMPT.format(content=content)
+    summaries = await asyncio.gather(
+        *(_generate(client, ANALYZE_PROMPT.format(content=s), model) for s in sections)
+    )
+    while len(summaries) > MERGE_GROUP_SIZE and all(summaries):
+        groups = [summaries[i:i + MERGE_GROUP_SIZE] for i in range(0, len(summaries), MERGE_GROUP_SIZE)]
+        summaries = await asyncio.gather(*(_generate(client, _merge_prompt(g), model) for g in groups))
+    if not all(summaries):
+        return None
+    return _merge_prompt(summaries)
+
+async def analyze(client: OllamaClient, content: str, model: str = ANALYZE_MODEL) -> Optional[str]:
+    prompt = await prepare_prompt(client, content, model)
+    if prompt is None:
+        return None
+    return await client.generate(prompt, model=model)
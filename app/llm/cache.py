@@ -0,0 +1,34 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import xxhash
+from cachetools import LRUCache
+
+class AnalysisCache:
+    """In-memory LRU of LLM outputs keyed by a hash of (model, content)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def key(model: str, content: str) -> str:
+        return xxhash.xxh3_64(model.encode() + b"\0" + content.encode()).hexdigest()
+
+    async def get(self, model: str, content: str) -> Optional[str]:
+        async with self._lock:
+            return self._cache.get(self.key(model, content))
+
+    async def put(self, model: str, content: str, result: str):
+        async with self._lock:
+            self._cache[self.key(model, content)] = result
+
+    async def get_or_generate(self, model: str, content: str, generate: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        cached = await self.get(model, content)
+        if cached is not None:
+            return cached
+        # The LLM call runs outside the lock so other lookups aren't held up by it.
+        result = await generate()
+        if result is not None:
+            await self.put(model, content, result)
+        return result
@@ -1,25 +1,54 @@
-import requests
-from typing import Optional
+import httpx
+import orjson
+from typing import AsyncIterator, Optional
 
 class OllamaClient:
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url
+        # A single pooled client keeps connections to Ollama alive between calls.
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=60,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
 
-    def generate(self, prompt: str, model: str = "codellama", temperature: float = 0.2, max_tokens: int = 512) -> Optional[str]:
-        url = f"{self.base_url}/api/generate"
-        payload = {
+    def _payload(self, prompt: str, model: str, temperature: float, max_tokens: int, stream: bool) -> dict:
+        return {
             "model": model,
             "prompt": prompt,
+            "stream": stream,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
             }
         }
+
+    async def generate(self, prompt: str, model: str = "codellama", temperature: float = 0.2, max_tokens: int = 512) -> Optional[str]:
+        payload = self._payload(prompt, model, temperature, max_tokens, stream=False)
         try:
-            response = requests.post(url, json=payload, timeout=60)
+            response = await self._client.post("/api/generate", json=payload)
             response.raise_for_status()
             data = response.json()
             return data.get("response")
         except Exception as e:
             print(f"Ollama request failed: {e}")
             return None
+
+    async def generate_stream(self, prompt: str, model: str = "codellama", temperature: float = 0.2, max_tokens: int = 512) -> AsyncIterator[str]:
+        """Yield response text as Ollama decodes it. Request errors propagate to the caller."""
+        payload = self._payload(prompt, model, temperature, max_tokens, stream=True)
+        async with self._client.stream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+
+    async def aclose(self):
+        await self._client.aclose()
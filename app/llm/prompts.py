@@ -0,0 +1,9 @@
+import os
+
+# Model names can be overridden, e.g. to point at a quantized Ollama build for faster inference.
+SCRAPE_MODEL = os.getenv("OLLAMA_SCRAPE_MODEL", "codellama")
+ANALYZE_MODEL = os.getenv("OLLAMA_ANALYZE_MODEL", "llama3.2")
+
+SCRAPE_PROMPT = "Generate a robust web scraping strategy for the following research query: '{query}'. Include anti-detection techniques."
+ANALYZE_PROMPT = "Analyze and summarize the following content for accuracy, relevance, and key points.\n\nContent:\n{content}"
+MERGE_PROMPT = "The following are analyses of consecutive sections of one document. Merge them into a single analysis of the whole content covering accuracy, relevance, and key points.\n\n{summaries}"
@@ -1,12 +1,22 @@
-from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Path, Body
+from fastapi import FastAPI, Depends, HTTPException, Path, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
 from datetime import datetime
+import asyncio
+import multiprocessing
+import os
 import time
-from sqlalchemy.orm import Session
-from app.db.models import ResearchTaskORM, SessionLocal, init_db
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.completions import CompletionQueue
+from app.db.models import CLAIM_RECOVERING_TASKS, COMPLETE_TASK, UPDATE_TASK, ResearchTaskORM, AsyncScopedSession, AsyncSessionLocal, init_db, mark_orphaned_tasks
+from app.llm.analysis import analyze, prepare_prompt
+from app.llm.cache import AnalysisCache
 from app.llm.ollama_client import OllamaClient
+from app.llm.prompts import ANALYZE_MODEL, SCRAPE_MODEL, SCRAPE_PROMPT
 
 app = FastAPI()
 
@@ -19,19 +29,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the database on startup
+ollama_client: Optional[OllamaClient] = None
+analysis_cache = AnalysisCache()
+completions: Optional[CompletionQueue] = None
+
+async def write_completions(params):
+    async with AsyncSessionLocal() as db:
+        await db.execute(COMPLETE_TASK, params)
+        await db.commit()
+
+async def _llm_worker(queue: asyncio.Queue, running: set, concurrency: int = 8):
+    """Run queued scraping-strategy jobs, at most `concurrency` at a time, over the shared Ollama client.
+
+    Jobs in flight are kept in `running` so shutdown can wait for them.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def on_done(job: asyncio.Task):
+        running.discard(job)
+        semaphore.release()
+        queue.task_done()
+
+    while True:
+        task_id, query = await queue.get()
+        await semaphore.acquire()
+        job = asyncio.create_task(llm_generate_scraping_strategy(task_id, query))
+        running.add(job)
+        job.add_done_callback(on_done)
+
+# Initialize the database, the pooled Ollama client, the LLM worker and the completion writer on startup
 @app.on_event("startup")
-def on_startup():
-    init_db()
+async def on_startup():
+    global ollama_client, completions
+    # The multi-worker launcher below prepares the database once before spawning workers.
+    if not os.getenv("MCPAGENT_DB_READY"):
+        init_db()
+        # Orphans can only be identified when no other API process is running: that holds
+        # for a single process, not for workers spawned by `uvicorn --workers`/`--reload`.
+        if multiprocessing.parent_process() is None:
+            mark_orphaned_tasks()
+    ollama_client = OllamaClient()
+    completions = CompletionQueue(write_completions)
+    completions.start()
+    app.state.llm_queue = asyncio.Queue()
+    app.state.llm_jobs = set()
+    # Re-queue tasks a previous run accepted but never finished.
+    async with AsyncSessionLocal() as db:
+        unfinished = (await db.execute(CLAIM_RECOVERING_TASKS)).all()
+        await db.commit()
+    for task_id, query in unfinished:
+        app.state.llm_queue.put_nowait((task_id, query))
+    app.state.llm_worker = asyncio.create_task(_llm_worker(app.state.llm_queue, app.state.llm_jobs))
 
-def get_db():
-    db = SessionLocal()
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Stop taking new jobs, but let the ones in flight write their results first.
+    # Anything still queued stays "queued" and is recovered on the next launch.
+    app.state.llm_worker.cancel()
+    await asyncio.gather(*app.state.llm_jobs)
+    await completions.stop()
+    await ollama_client.aclose()
+
+async def get_db():
+    db = AsyncScopedSession()
     try:
         yield db
     finally:
-        db.close()
+        await AsyncScopedSession.remove()
 
 class ResearchTask(BaseModel):
+    # Lets response_model validate ORM objects and result rows directly.
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     query: str
     status: str
@@ -39,23 +108,42 @@ class ResearchTask(BaseModel):
     timestamp: datetime
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the MCP Autonomous Web Research Agent Server!"}
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
-@app.get("/research", response_model=List[ResearchTask])
-def get_research_tasks(db: Session = Depends(get_db)):
-    tasks = db.query(ResearchTaskORM).all()
-    return [ResearchTask(
-        id=t.id,
-        query=t.query,
-        status=t.status,
-        result=t.result,
-        timestamp=t.timestamp
-    ) for t in tasks]
+@app.get("/research")
+async def get_research_tasks(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of tasks to return."),
+    before_id: Optional[int] = Query(None, description="Only return tasks with an ID lower than this cursor."),
+    db: AsyncSession = Depends(get_db)
+):
+    # Serialize plain rows straight to JSON, skipping ORM objects and response_model validation.
+    # `result` can be large, so it is only served by GET /research/{task_id}.
+    stmt = select(
+        ResearchTaskORM.id,
+        ResearchTaskORM.query,
+        ResearchTaskORM.status,
+        ResearchTaskORM.timestamp
+    ).order_by(ResearchTaskORM.id.desc()).limit(limit)
+    if before_id is not None:
+        stmt = stmt.where(ResearchTaskORM.id < before_id)
+    tasks = [r._asdict() for r in (await db.execute(stmt)).all()]
+    next_before_id = tasks[-1]["id"] if len(tasks) == limit else None
+    return Response(orjson.dumps({"tasks": tasks, "next_before_id": next_before_id}), media_type="application/json")
+
+@app.get("/research/{task_id}", response_model=ResearchTask)
+async def get_research_task(
+    task_id: int = Path(..., description="The ID of the research task to fetch."),
+    db: AsyncSession = Depends(get_db)
+):
+    task = await db.get(ResearchTaskORM, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
 
 class ResearchTaskRequest(BaseModel):
     query: str
@@ -66,67 +154,41 @@ def simulate_scraping(task: ResearchTask):
     task.status = "completed"
     task.result = f"Simulated research result for query: '{task.query}'"
 
-ollama_client = OllamaClient()
-
-def llm_generate_scraping_strategy(task_id: int, query: str):
-    db = SessionLocal()
-    try:
-        task = db.query(ResearchTaskORM).filter(ResearchTaskORM.id == task_id).first()
-        if not task:
-            return
-        prompt = f"Generate a robust web scraping strategy for the following research query: '{query}'. Include anti-detection techniques."
-        result = ollama_client.generate(prompt, model="codellama")
-        task.result = result or "LLM did not return a result."
-        task.status = "completed"
-        db.commit()
-    finally:
-        db.close()
+async def llm_generate_scraping_strategy(task_id: int, query: str):
+    prompt = SCRAPE_PROMPT.format(query=query)
+    result = await ollama_client.generate(prompt, model=SCRAPE_MODEL)
+    await completions.put(task_id, result or "LLM did not return a result.")
 
 @app.post("/research", response_model=ResearchTask)
-def create_research_task(task_req: ResearchTaskRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def create_research_task(task_req: ResearchTaskRequest, db: AsyncSession = Depends(get_db)):
+    # "queued" marks the task as owned by this API's worker queue (see app.db.models).
     task = ResearchTaskORM(
         query=task_req.query,
-        status="pending",
+        status="queued",
         result=None
     )
     db.add(task)
-    db.commit()
-    db.refresh(task)
-    background_tasks.add_task(llm_generate_scraping_strategy, task.id, task.query)
-    return ResearchTask(
-        id=task.id,
-        query=task.query,
-        status=task.status,
-        result=task.result,
-        timestamp=task.timestamp
-    )
+    await db.commit()
+    await db.refresh(task)
+    await app.state.llm_queue.put((task.id, task.query))
+    return task
 
 class ResearchTaskUpdate(BaseModel):
     status: Optional[str] = None
     result: Optional[str] = None
 
 @app.patch("/research/{task_id}", response_model=ResearchTask)
-def update_research_task(
+async def update_research_task(
     update: ResearchTaskUpdate,
     task_id: int = Path(..., description="The ID of the research task to update."),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    task = db.query(ResearchTaskORM).filter(ResearchTaskORM.id == task_id).first()
+    # One UPDATE ... RETURNING round trip instead of SELECT + UPDATE + refresh.
+    task = (await db.execute(UPDATE_TASK, {"tid": task_id, "st": update.status, "rs": update.result})).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    if update.status is not None:
-        task.status = update.status
-    if update.result is not None:
-        task.result = update.result
-    db.commit()
-    db.refresh(task)
-    return ResearchTask(
-        id=task.id,
-        query=task.query,
-        status=task.status,
-        result=task.result,
-        timestamp=task.timestamp
-    )
+    await db.commit()
+    return task
 
 class ContentAnalysisRequest(BaseModel):
     content: str
@@ -135,7 +197,61 @@ class ContentAnalysisResponse(BaseModel):
     analysis: str
 
 @app.post("/analyze", response_model=ContentAnalysisResponse)
-def analyze_content(request: ContentAnalysisRequest = Body(...)):
-    prompt = f"Analyze and summarize the following content for accuracy, relevance, and key points.\n\nContent:\n{request.content}"
-    analysis = ollama_client.generate(prompt, model="llama3.2")
-    return ContentAnalysisResponse(analysis=analysis or "LLM did not return a result.") 
\ No newline at end of file
+async def analyze_content(request: ContentAnalysisRequest = Body(...)):
+    analysis = await analysis_cache.get_or_generate(
+        ANALYZE_MODEL, request.content, lambda: analyze(ollama_client, request.content)
+    )
+    return ContentAnalysisResponse(analysis=analysis or "LLM did not return a result.")
+
+@app.post("/analyze/stream")
+async def analyze_content_stream(request: ContentAnalysisRequest = Body(...)):
+    """Stream the analysis as server-sent events, one JSON-encoded text chunk per event."""
+    def event(text: str) -> bytes:
+        return b"data: " + orjson.dumps(text) + b"\n\n"
+
+    async def events():
+        cached = await analysis_cache.get(ANALYZE_MODEL, request.content)
+        if cached is not None:
+            yield event(cached)
+            return
+        # Long content is summarized section by section first; only the final pass is streamed.
+        prompt = await prepare_prompt(ollama_client, request.content)
+        if prompt is None:
+            yield event("LLM did not return a result.")
+            return
+        chunks = []
+        try:
+            async for chunk in ollama_client.generate_stream(prompt, model=ANALYZE_MODEL):
+                chunks.append(chunk)
+                yield event(chunk)
+        except Exception as e:
+            print(f"Ollama request failed: {e}")
+            if not chunks:
+                yield event("LLM did not return a result.")
+            return
+        if not chunks:
+            yield event("LLM did not return a result.")
+            return
+        await analysis_cache.put(ANALYZE_MODEL, request.content, "".join(chunks))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Prepare the database and mark orphaned tasks once here, before any worker exists;
+    # the workers inherit MCPAGENT_DB_READY and skip this step.
+    init_db()
+    mark_orphaned_tasks()
+    os.environ["MCPAGENT_DB_READY"] = "1"
+
+    # Each worker imports this module and so builds its own engines, Ollama client and queues.
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )
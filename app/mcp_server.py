@@ -1,6 +1,7 @@
 import asyncio
 import json
 from typing import Any, Dict, List, Optional
+from sqlalchemy import select
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
@@ -24,12 +25,23 @@ from mcp.types import (
     ListResourcesResult,
 )
 
-from app.db.models import ResearchTaskORM, SessionLocal, init_db
+from app.db.completions import CompletionQueue
+from app.db.models import COMPLETE_TASK, UPDATE_TASK_STATUS, ResearchTaskORM, ScopedSession, init_db
+from app.llm.analysis import analyze
+from app.llm.cache import AnalysisCache
 from app.llm.ollama_client import OllamaClient
+from app.llm.prompts import ANALYZE_MODEL, SCRAPE_MODEL, SCRAPE_PROMPT
 
 # Initialize database and Ollama client
 init_db()
 ollama_client = OllamaClient()
+analysis_cache = AnalysisCache()
+# Background LLM jobs in flight; holding them here keeps them from being garbage-collected
+# and lets shutdown wait for their results.
+llm_jobs = set()
+
+# Upper bound on tasks returned by a single list_research_tasks call
+MAX_LIST_TASKS = 500
 
 # Create MCP server
 server = Server("mcpagent-research")
@@ -54,10 +66,21 @@ async def handle_list_tools() -> ListToolsResult:
         ),
         Tool(
             name="list_research_tasks",
-            description="List all research tasks",
+            description="List research tasks, newest first",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "maximum": MAX_LIST_TASKS,
+                        "description": f"Maximum number of tasks to return (default 50, at most {MAX_LIST_TASKS})"
+                    },
+                    "before_id": {
+                        "type": "integer",
+                        "description": "Only list tasks with an ID lower than this cursor"
+                    }
+                },
                 "required": []
             }
         ),
@@ -107,7 +130,7 @@ async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResu
         if name == "create_research_task":
             return await create_research_task(arguments)
         elif name == "list_research_tasks":
-            return await list_research_tasks()
+            return await list_research_tasks(arguments)
         elif name == "update_research_task":
             return await update_research_task(arguments)
         elif name == "analyze_content":
@@ -120,6 +143,8 @@ async def handle_call_tool(name: str, arguments: Dict[str, Any]) -> CallToolResu
         return CallToolResult(
             content=[TextContent(type="text", text=f"Error: {str(e)}")]
         )
+    finally:
+        ScopedSession.remove()
 
 async def create_research_task(arguments: Dict[str, Any]) -> CallToolResult:
     """Create a new research task."""
@@ -129,8 +154,7 @@ async def create_research_task(arguments: Dict[str, Any]) -> CallToolResult:
             content=[TextContent(type="text", text="Error: query is required")]
         )
     
-    db = SessionLocal()
-    try:
+    with ScopedSession() as db:
         task = ResearchTaskORM(
             query=query,
             status="pending",
@@ -141,7 +165,9 @@ async def create_research_task(arguments: Dict[str, Any]) -> CallToolResult:
         db.refresh(task)
         
         # Generate LLM response in background
-        asyncio.create_task(generate_llm_response(task.id, query))
+        job = asyncio.create_task(generate_llm_response(task.id, query))
+        llm_jobs.add(job)
+        job.add_done_callback(llm_jobs.discard)
         
         return CallToolResult(
             content=[TextContent(
@@ -149,31 +175,43 @@ async def create_research_task(arguments: Dict[str, Any]) -> CallToolResult:
                 text=f"Research task created with ID {task.id}. Status: {task.status}"
             )]
         )
-    finally:
-        db.close()
 
-async def list_research_tasks() -> CallToolResult:
-    """List all research tasks."""
-    db = SessionLocal()
-    try:
-        tasks = db.query(ResearchTaskORM).all()
-        if not tasks:
-            return CallToolResult(
-                content=[TextContent(type="text", text="No research tasks found.")]
-            )
-        
-        task_list = []
-        for task in tasks:
-            task_list.append(f"ID: {task.id}, Query: {task.query}, Status: {task.status}")
+async def list_research_tasks(arguments: Dict[str, Any]) -> CallToolResult:
+    """List a page of research tasks, newest first."""
+    # Clamp on the server too: SQLite treats a negative LIMIT as "no limit".
+    limit = max(1, min(int(arguments.get("limit") or 50), MAX_LIST_TASKS))
+    before_id = arguments.get("before_id")
+    
+    with ScopedSession() as db:
+        # Only the columns that are printed, streamed in batches rather than loaded as ORM objects.
+        stmt = (
+            select(ResearchTaskORM.id, ResearchTaskORM.query, ResearchTaskORM.status)
+            .order_by(ResearchTaskORM.id.desc())
+            .limit(limit)
+            .execution_options(yield_per=256)
+        )
+        if before_id is not None:
+            stmt = stmt.where(ResearchTaskORM.id < before_id)
         
+        task_list = ["Research Tasks:"]
+        last_id = None
+        for last_id, query, status in db.execute(stmt):
+            task_list.append(f"ID: {last_id}, Query: {query}, Status: {status}")
+    
+    count = len(task_list) - 1
+    if not count:
         return CallToolResult(
-            content=[TextContent(
-                type="text", 
-                text="Research Tasks:\n" + "\n".join(task_list)
-            )]
+            content=[TextContent(type="text", text="No research tasks found.")]
         )
-    finally:
-        db.close()
+    if count == limit:
+        task_list.append(f"More tasks available; pass before_id={last_id} to continue.")
+    
+    return CallToolResult(
+        content=[TextContent(
+            type="text", 
+            text="\n".join(task_list)
+        )]
+    )
 
 async def update_research_task(arguments: Dict[str, Any]) -> CallToolResult:
     """Update a research task."""
@@ -186,29 +224,23 @@ async def update_research_task(arguments: Dict[str, Any]) -> CallToolResult:
             content=[TextContent(type="text", text="Error: task_id is required")]
         )
     
-    db = SessionLocal()
-    try:
-        task = db.query(ResearchTaskORM).filter(ResearchTaskORM.id == task_id).first()
-        if not task:
+    with ScopedSession() as db:
+        new_status = db.execute(
+            UPDATE_TASK_STATUS, {"tid": task_id, "st": status or None, "rs": result or None}
+        ).scalar_one_or_none()
+        if new_status is None:
             return CallToolResult(
                 content=[TextContent(type="text", text=f"Task {task_id} not found")]
             )
         
-        if status:
-            task.status = status
-        if result:
-            task.result = result
-        
         db.commit()
         
         return CallToolResult(
             content=[TextContent(
                 type="text", 
-                text=f"Task {task_id} updated successfully. Status: {task.status}"
+                text=f"Task {task_id} updated successfully. Status: {new_status}"
             )]
         )
-    finally:
-        db.close()
 
 async def analyze_content(arguments: Dict[str, Any]) -> CallToolResult:
     """Analyze content using Llama 3.2."""
@@ -218,8 +250,9 @@ async def analyze_content(arguments: Dict[str, Any]) -> CallToolResult:
             content=[TextContent(type="text", text="Error: content is required")]
         )
     
-    prompt = f"Analyze and summarize the following content for accuracy, relevance, and key points.\n\nContent:\n{content}"
-    analysis = ollama_client.generate(prompt, model="llama3.2")
+    analysis = await analysis_cache.get_or_generate(
+        ANALYZE_MODEL, content, lambda: analyze(ollama_client, content)
+    )
     
     return CallToolResult(
         content=[TextContent(
@@ -230,36 +263,44 @@ async def analyze_content(arguments: Dict[str, Any]) -> CallToolResult:
 
 async def generate_llm_response(task_id: int, query: str):
     """Generate LLM response for a research task in background."""
-    db = SessionLocal()
+    prompt = SCRAPE_PROMPT.format(query=query)
+    result = await ollama_client.generate(prompt, model=SCRAPE_MODEL)
+    await completions.put(task_id, result or "LLM did not return a result.")
+
+async def write_completions(params: List[Dict[str, Any]]):
+    """Write a batch of finished LLM results in one executemany UPDATE."""
+    # The scoped session is shared by everything on this thread, so only hold it
+    # for the synchronous write and never across an await.
     try:
-        task = db.query(ResearchTaskORM).filter(ResearchTaskORM.id == task_id).first()
-        if not task:
-            return
-        
-        prompt = f"Generate a robust web scraping strategy for the following research query: '{query}'. Include anti-detection techniques."
-        result = ollama_client.generate(prompt, model="codellama")
-        
-        task.result = result or "LLM did not return a result."
-        task.status = "completed"
-        db.commit()
+        with ScopedSession() as db:
+            db.execute(COMPLETE_TASK, params)
+            db.commit()
     finally:
-        db.close()
+        ScopedSession.remove()
+
+completions = CompletionQueue(write_completions)
 
 async def main():
     """Run the MCP server."""
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="mcpagent-research",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=None,
-                    experimental_capabilities=None,
+    completions.start()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="mcpagent-research",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=None,
+                        experimental_capabilities=None,
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        await asyncio.gather(*llm_jobs)
+        await completions.stop()
+        await ollama_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -1,14 +1,57 @@
 import streamlit as st
 import requests
+import json
+from requests.adapters import HTTPAdapter
 
 API_URL = "http://localhost:8000"
 
 st.set_page_config(page_title="MCPAgent Web Research UI", layout="wide")
 st.title("🧠 MCPAgent Autonomous Web Research")
 
+@st.cache_resource
+def get_client():
+    """One keep-alive session shared across reruns so the connection to the API is reused."""
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=5)
+def fetch_tasks(before_id=None):
+    """Fetch one page of tasks, newest first, as {"tasks": [...], "next_before_id": ...}."""
+    params = {"before_id": before_id} if before_id is not None else {}
+    resp = get_client().get(f"{API_URL}/research", params=params, timeout=5)
+    resp.raise_for_status()
+    return resp.json()
+
+@st.cache_data(ttl=5)
+def fetch_task(task_id):
+    """Fetch one task including its result, or None if the API doesn't have it."""
+    resp = get_client().get(f"{API_URL}/research/{task_id}", timeout=5)
+    if not resp.ok:
+        return None
+    return resp.json()
+
+@st.cache_data(ttl=10)
+def get_health():
+    try:
+        return get_client().get(f"{API_URL}/health", timeout=2).json()
+    except requests.RequestException:
+        return {"status": "unreachable"}
+
+def stream_analysis(content):
+    """Yield analysis text chunks from the server-sent events of /analyze/stream."""
+    with get_client().post(f"{API_URL}/analyze/stream", json={"content": content}, stream=True) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
 # --- Health Check ---
 st.sidebar.header("Server Health")
-health = requests.get(f"{API_URL}/health").json()
+health = get_health()
 status = health.get("status", "unknown")
 if status == "ok":
     st.sidebar.success(f"Server status: {status}")
@@ -21,26 +64,56 @@ with st.form("create_task_form"):
     query = st.text_input("Enter your research query:")
     submitted = st.form_submit_button("Submit Task")
     if submitted and query:
-        resp = requests.post(f"{API_URL}/research", json={"query": query})
+        resp = get_client().post(f"{API_URL}/research", json={"query": query})
         if resp.status_code == 200:
             st.success("Task submitted!")
+            fetch_tasks.clear()
         else:
             st.error(f"Error: {resp.text}")
 
 # --- List All Research Tasks ---
 st.header("2. All Research Tasks")
 if st.button("Refresh Task List"):
-    st.session_state["tasks"] = requests.get(f"{API_URL}/research").json()
-tasks = st.session_state.get("tasks", requests.get(f"{API_URL}/research").json())
+    fetch_tasks.clear()
+    fetch_task.clear()
+# Only the number of pages shown lives in session state; each page's cursor is taken from
+# the page before it, so new tasks can't open a gap between pages.
+page_count = st.session_state.setdefault("task_pages", 1)
+tasks = []
+next_before_id = None
+for _ in range(page_count):
+    try:
+        page = fetch_tasks(next_before_id)
+    except requests.RequestException as e:
+        # Failures aren't cached, so the next rerun tries again.
+        st.error(f"Could not load tasks: {e}")
+        tasks, next_before_id = [], None
+        break
+    tasks.extend(page["tasks"])
+    next_before_id = page["next_before_id"]
+    if next_before_id is None:
+        break
 if tasks:
     st.dataframe(tasks)
+    if next_before_id is not None and st.button("Load older tasks"):
+        st.session_state["task_pages"] = page_count + 1
+        st.rerun()
     st.subheader("Task Details")
-    for t in tasks:
-        with st.expander(f"Task #{t['id']}: {t['query']}"):
-            st.markdown(f"**Status:** {t['status']}")
-            st.markdown(f"**Timestamp:** {t['timestamp']}")
-            st.markdown("**Result:**")
-            st.code(t['result'] or "No result yet.", language="markdown")
+    # The list endpoint omits results, so fetch the full task only for the one being viewed.
+    detail_id = st.selectbox("Select Task ID to View", [t["id"] for t in tasks])
+    try:
+        detail = fetch_task(detail_id)
+    except requests.RequestException as e:
+        st.error(f"Error: {e}")
+    else:
+        if detail:
+            with st.expander(f"Task #{detail['id']}: {detail['query']}", expanded=True):
+                st.markdown(f"**Status:** {detail['status']}")
+                st.markdown(f"**Timestamp:** {detail['timestamp']}")
+                st.markdown("**Result:**")
+                st.code(detail['result'] or "No result yet.", language="markdown")
+        else:
+            st.warning(f"Task #{detail_id} could not be loaded.")
 else:
     st.info("No research tasks found.")
 
@@ -52,10 +125,11 @@ if tasks:
     new_status = st.text_input("New Status", value="completed")
     new_result = st.text_area("New Result", value="")
     if st.button("Update Task"):
-        resp = requests.patch(f"{API_URL}/research/{selected_id}", json={"status": new_status, "result": new_result})
+        resp = get_client().patch(f"{API_URL}/research/{selected_id}", json={"status": new_status, "result": new_result})
         if resp.status_code == 200:
             st.success("Task updated!")
-            st.session_state["tasks"] = requests.get(f"{API_URL}/research").json()
+            fetch_tasks.clear()
+            fetch_task.clear()
         else:
             st.error(f"Error: {resp.text}")
 else:
@@ -65,9 +139,8 @@ else:
 st.header("4. Analyze Content with Llama 3.2")
 content = st.text_area("Paste content to analyze:")
 if st.button("Analyze Content") and content:
-    resp = requests.post(f"{API_URL}/analyze", json={"content": content})
-    if resp.status_code == 200:
-        st.subheader("Analysis Result:")
-        st.write(resp.json().get("analysis", "No result."))
-    else:
-        st.error(f"Error: {resp.text}") 
\ No newline at end of file
+    st.subheader("Analysis Result:")
+    try:
+        st.write_stream(stream_analysis(content))
+    except requests.RequestException as e:
+        st.error(f"Error: {e}") 
\ No newline at end of file